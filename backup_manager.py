@@ -1,14 +1,23 @@
 import os
+import re
 import shutil
 from datetime import datetime
 
 
+# kubeconfig_backup_<timestamp>.<target file name>.yaml. Backups made by older
+# versions have no target name and are only treated as the target's own when
+# no other target keeps backups in the same directory.
+BACKUP_PATTERN = re.compile(r"kubeconfig_backup_(\d{8}_\d{6}(?:_\d{6})?)(?:\.(.+))?\.yaml")
+
+
 def create_backup(kubeconfig_path):
     backup_dir = os.path.join(os.path.dirname(kubeconfig_path), "kubezap_backups")
     os.makedirs(backup_dir, exist_ok=True)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_filename = f"kubeconfig_backup_{timestamp}.yaml"
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    backup_filename = (
+        f"kubeconfig_backup_{timestamp}.{os.path.basename(kubeconfig_path)}.yaml"
+    )
     backup_path = os.path.join(backup_dir, backup_filename)
 
     shutil.copy2(kubeconfig_path, backup_path)
@@ -20,12 +29,25 @@ def manage_backups(kubeconfig_path, max_backups):
     if not os.path.exists(backup_dir):
         return
 
-    backups = sorted(
-        [f for f in os.listdir(backup_dir) if f.startswith("kubeconfig_backup_")],
-        reverse=True,
-    )
+    target_name = os.path.basename(kubeconfig_path)
+    backups = []
+    legacy_backups = []
+    other_targets = False
+    for f in os.listdir(backup_dir):
+        match = BACKUP_PATTERN.fullmatch(f)
+        if not match:
+            continue
+        if match.group(2) is None:
+            legacy_backups.append((match.group(1), f))
+        elif match.group(2) == target_name:
+            backups.append((match.group(1), f))
+        else:
+            other_targets = True
+
+    if not other_targets:
+        backups.extend(legacy_backups)
+    backups = [f for _, f in sorted(backups, reverse=True)]
 
     while len(backups) > max_backups:
         oldest_backup = backups.pop()
         os.remove(os.path.join(backup_dir, oldest_backup))
-
@@ -0,0 +1,63 @@
+import json
+import os
+import time
+from pathlib import Path
+
+# Directory mtimes are only trusted once they are older than this, so that an
+# entry created in the same timestamp tick as the scan is not cached away.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def get_cache_path():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return Path(cache_home) / "kubezap" / "completion.json"
+
+
+def load_cache(cache_path):
+    try:
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_cache(cache, cache_path):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # Completion must never fail because the cache is not writable.
+        pass
+
+
+def list_directory_files(directory, cache_path=None):
+    cache_path = cache_path or get_cache_path()
+    directory = os.path.abspath(directory)
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        return []
+
+    cache = load_cache(cache_path)
+    entry = cache.get(directory)
+    if entry and entry.get("mtime_ns") == mtime_ns:
+        return entry["files"]
+
+    # Only the directory whose mtime changed is rescanned; os.scandir reports
+    # the entry type without a stat() per file on most filesystems.
+    try:
+        with os.scandir(directory) as entries:
+            files = sorted(e.name for e in entries if e.is_file())
+    except OSError:
+        return []
+
+    if time.time_ns() - mtime_ns > RACY_WINDOW_NS:
+        cache[directory] = {"mtime_ns": mtime_ns, "files": files}
+        save_cache(cache, cache_path)
+    return files
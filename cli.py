@@ -1,9 +1,11 @@
 import argparse
 import argcomplete
-import glob
 import os
+import sys
 import textwrap
 
+from cache_manager import list_directory_files
+
 __version__ = "1.0.0"
 
 
@@ -86,87 +88,194 @@ def config_completer(prefix, parsed_args, **kwargs):
     )
     return (
         f
-        for f in glob.glob(os.path.join(download_location, prefix + "*"))
-        if os.path.isfile(f)
+        for f in list_directory_files(os.path.expanduser(download_location))
+        if f.startswith(prefix)
     )
 
 
-def parse_args():
-    description = """
-    KubeZap: A tool to update kubeconfig with new configurations.
+COMMANDS = ("plan", "apply")
 
-    This tool allows you to merge new kubeconfig files into your existing kubeconfig,
-    while maintaining backups and providing detailed information about the changes made.
 
-    Features:
-    - Automatic backup creation
-    - Customizable number of backup files to keep
-    - Automatic rollback on failure
-    - Detailed merge information in verbose mode
-    - Diff output to show exact changes
-    """
+def _default(value, suppress_defaults):
+    # Subcommand parsers must not overwrite options given before the command
+    return argparse.SUPPRESS if suppress_defaults else value
 
-    parser = argparse.ArgumentParser(
-        description=description,
-        formatter_class=CustomFormatter,
+
+def add_common_arguments(parser, suppress_defaults=False):
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        default=_default(False, suppress_defaults),
+        help="Increase output verbosity",
+    )
+    parser.add_argument(
+        "-b",
+        "--backup",
+        type=int,
+        default=_default(5, suppress_defaults),
+        help="Number of backup files to keep",
+    )
+    parser.add_argument(
+        "-d",
+        "--diff",
+        action="store_true",
+        default=_default(False, suppress_defaults),
+        help="Show diff of changes",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=_default(4, suppress_defaults),
+        help="Number of kubeconfig targets to update in parallel",
+    )
+
 
+def add_update_arguments(parser, suppress_defaults=False):
     parser.add_argument(
         "-k",
         "--kubeconfig",
-        help="Path to the kubeconfig file to update",
+        help="Path(s) or glob pattern(s) of the kubeconfig file(s) to update",
+        nargs="+",
+        default=_default(None, suppress_defaults),
     )
     parser.add_argument(
         "-l",
         "--download-location",
+        default=_default(None, suppress_defaults),
         help="Directory containing the new kubeconfig files",
     )
+    parser.add_argument(
+        "-s",
+        "--source",
+        default=_default(None, suppress_defaults),
+        help="URL of a config index to fetch the new kubeconfig files from, "
+        "instead of a directory",
+    )
     parser.add_argument(
         "-c",
         "--conf-name",
         help="Name pattern for the new kubeconfig files",
         nargs="*",
-        default=["config*.yaml"],
-    )
+        default=_default(["config*.yaml"], suppress_defaults),
+    ).completer = config_completer
     parser.add_argument(
         "-n",
         "--number-of-configs",
         type=int,
-        default=1,
+        default=_default(1, suppress_defaults),
         help="Number of most recent config files to process",
     )
     parser.add_argument(
-        "-v",
-        "--verbose",
+        "--low-memory",
         action="store_true",
-        help="Increase output verbosity",
+        default=_default(False, suppress_defaults),
+        help="Stream diff output and avoid keeping copies of the kubeconfig in memory",
     )
+    add_common_arguments(parser, suppress_defaults)
+
+
+def _arguments_parser(add_arguments, suppress_defaults=False):
+    parser = argparse.ArgumentParser(add_help=False)
+    add_arguments(parser, suppress_defaults)
+    return parser
+
+
+def _command_first(parser, argv):
+    # Greedy options such as -k would swallow a command name given after them,
+    # so the command is moved in front of any options preceding it. A token
+    # directly after an option that takes a value is that option's value.
+    value_options = {
+        option
+        for action in parser._actions
+        if action.nargs != 0
+        for option in action.option_strings
+    }
+    argv = list(argv)
+    expects_value = False
+    for i, token in enumerate(argv):
+        if token == "--":
+            break
+        if token in COMMANDS and not expects_value:
+            argv.insert(0, argv.pop(i))
+            break
+        expects_value = token in value_options
+    return argv
+
+
+def parse_args(argv=None):
+    description = """
+    KubeZap: A tool to update kubeconfig with new configurations.
+
+    This tool allows you to merge new kubeconfig files into your existing kubeconfig,
+    while maintaining backups and providing detailed information about the changes made.
+
+    Features:
+    - Automatic backup creation
+    - Customizable number of backup files to keep
+    - Automatic rollback on failure
+    - Detailed merge information in verbose mode
+    - Diff output to show exact changes
+    - Fan-out to several kubeconfig targets in parallel
+    - Plan/apply workflow: review the changes first, apply them later
+    """
+
+    parser = argparse.ArgumentParser(
+        description=description,
+        formatter_class=CustomFormatter,
+        parents=[_arguments_parser(add_update_arguments)],
+    )
+
     parser.add_argument(
         "--version",
         action=VersionAction,
         version=f"KubeZap v{__version__}",
     )
-    parser.add_argument(
-        "-b",
-        "--backup",
-        type=int,
-        default=5,
-        help="Number of backup files to keep",
-    )
-    parser.add_argument(
-        "-d",
-        "--diff",
-        action="store_true",
-        help="Show diff of changes",
-    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
         help="Perform a dry run without making any changes",
     )
 
+    subparsers = parser.add_subparsers(
+        prog=parser.prog,
+        dest="command",
+        metavar="COMMAND",
+        help="plan: save the computed changes to a plan file, apply: write a saved plan",
+    )
+
+    plan_parser = subparsers.add_parser(
+        "plan",
+        description="Compute the changes and save them to a plan file "
+        "without touching the kubeconfig.",
+        formatter_class=CustomFormatter,
+        parents=[_arguments_parser(add_update_arguments, suppress_defaults=True)],
+    )
+    plan_parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Path of the plan file to write",
+    )
+    plan_parser.set_defaults(dry_run=True)
+
+    apply_parser = subparsers.add_parser(
+        "apply",
+        description="Write a plan created by 'kubezap plan' if its inputs are unchanged.",
+        formatter_class=CustomFormatter,
+        parents=[_arguments_parser(add_common_arguments, suppress_defaults=True)],
+    )
+    apply_parser.add_argument(
+        "plan_file",
+        help="Path of the plan file to apply",
+    )
+    apply_parser.set_defaults(dry_run=False)
+
     argcomplete.autocomplete(parser)
-    return parser.parse_args()
+    return parser.parse_args(
+        _command_first(parser, sys.argv[1:] if argv is None else argv)
+    )
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
+import copy
 import yaml
 import difflib
 import yamale
@@ -5,7 +6,7 @@ import yamale
 import tempfile
 
 
-def validate_kubeconfig(config_path):
+def validate_kubeconfig(config_path, config=None):
     schema_content = """
 apiVersion: str()
 kind: str()
@@ -38,7 +39,11 @@ user:
         temp_schema_file.flush()
         schema = yamale.make_schema(temp_schema_file.name)
 
-    data = yamale.make_data(config_path)
+    if config is None:
+        data = yamale.make_data(config_path)
+    else:
+        # Validate an already parsed document instead of parsing the file again
+        data = [(config, str(config_path))]
     try:
         yamale.validate(schema, data)
         return True, None
@@ -55,8 +60,168 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def iter_yaml_dump(config):
+    """Yield yaml.dump(config, default_flow_style=False) in chunks.
+
+    Top-level keys and the items of top-level lists are dumped one at a time,
+    so PyYAML never builds a node graph for the whole document.
+    """
+    for key in sorted(config):
+        value = config[key]
+        if isinstance(value, list) and value:
+            # Block sequences under a mapping key are not indented, so the
+            # items can be dumped as standalone one-item lists.
+            yield yaml.dump({key: [None]}, default_flow_style=False).splitlines(True)[0]
+            for item in value:
+                yield yaml.dump([item], default_flow_style=False)
+        else:
+            yield yaml.dump({key: value}, default_flow_style=False)
+
+
+def iter_yaml_lines(config):
+    for chunk in iter_yaml_dump(config):
+        yield from chunk.splitlines()
+
+
+def merge_would_change(existing_config, new_config):
+    """Tell whether merge_configs would modify existing_config, without copying it."""
+    if "current-context" in new_config and (
+        "current-context" not in existing_config
+        or new_config["current-context"] != existing_config["current-context"]
+    ):
+        return True
+
+    for key, field in [("clusters", "cluster"), ("contexts", "context"), ("users", "user")]:
+        if key not in existing_config:
+            return True
+        new_items = {item["name"]: item for item in new_config.get(key, [])}
+        existing_names = [item["name"] for item in existing_config[key]]
+        if len(set(existing_names)) != len(existing_names):
+            return True
+        if set(existing_names) != set(new_items):
+            return True
+        for existing_item in existing_config[key]:
+            if field not in existing_item:
+                return True
+            existing_field = existing_item[field]
+            for k, v in new_items[existing_item["name"]].get(field, {}).items():
+                if k not in existing_field or existing_field[k] != v:
+                    return True
+    return False
+
+
+def compute_update(existing_config, new_config, show_diff=False, low_memory=False):
+    changes = []
+    diff_output = []
+
+    # Get the cluster name from the new config
+    new_cluster_name = new_config.get("clusters", [{}])[0].get(
+        "name", "Unknown Cluster"
+    )
+
+    # Check if the cluster already exists in the kubeconfig
+    existing_cluster = next(
+        (
+            c
+            for c in existing_config.get("clusters", [])
+            if c["name"] == new_cluster_name
+        ),
+        None,
+    )
+
+    old_current_context = existing_config.get("current-context")
+
+    if low_memory:
+        # Merge in place instead of deep-copying the whole document; the diff
+        # only keeps the original's lines, not a second parsed copy.
+        existing_cluster = copy.deepcopy(existing_cluster)
+        changed = merge_would_change(existing_config, new_config)
+        old_lines = (
+            list(iter_yaml_lines(existing_config))
+            if show_diff and (changed or not existing_cluster)
+            else None
+        )
+        updated_config = merge_configs(existing_config, new_config)
+    else:
+        updated_config = merge_configs(copy.deepcopy(existing_config), new_config)
+        changed = updated_config != existing_config
+
+    if existing_cluster:
+        if changed:
+            changes.append(f"Updated cluster {new_cluster_name}")
+    else:
+        changes.append(f"Added new cluster {new_cluster_name}")
+
+    logger.debug("Updated config after merge: %s", updated_config)
+
+    if changes:
+        new_clusters = [
+            c
+            for c in updated_config.get("clusters", [])
+            if c["name"] == new_cluster_name
+        ]
+        new_contexts = [
+            c
+            for c in updated_config.get("contexts", [])
+            if new_cluster_name in c.get("context", {}).values()
+        ]
+        new_users = [
+            u
+            for u in updated_config.get("users", [])
+            if u["name"] in [ctx.get("context", {}).get("user") for ctx in new_contexts]
+        ]
+
+        for cluster in new_clusters:
+            changes.append(f"  Updated cluster: {cluster['name']}")
+            # Print detailed cluster changes
+            old_cluster = existing_cluster or {}
+            for key, value in cluster.get("cluster", {}).items():
+                if (
+                    key not in old_cluster.get("cluster", {})
+                    or old_cluster["cluster"][key] != value
+                ):
+                    changes.append(f"    {key}: {value}")
+        for context in new_contexts:
+            changes.append(f"  Updated context: {context['name']}")
+        for user in new_users:
+            changes.append(f"  Updated user: {user['name']}")
+        if (
+            "current-context" in new_config
+            and new_config["current-context"] != old_current_context
+        ):
+            changes.append(
+                f"  Updated current-context: {new_config['current-context']}"
+            )
+
+        if show_diff and low_memory:
+            # Returned lazily so the caller can stream the lines out.
+            diff_output = difflib.unified_diff(
+                old_lines,
+                list(iter_yaml_lines(updated_config)),
+                fromfile="Original",
+                tofile="Updated",
+                lineterm="",
+            )
+        elif show_diff:
+            diff = difflib.unified_diff(
+                yaml.dump(existing_config, default_flow_style=False).splitlines(),
+                yaml.dump(updated_config, default_flow_style=False).splitlines(),
+                fromfile="Original",
+                tofile="Updated",
+                lineterm="",
+            )
+            diff_output.extend(list(diff))
+
+    return changes, diff_output, updated_config
+
+
 def update_kubeconfig(
-    kubeconfig_path, new_config, max_backups, show_diff=False, dry_run=False
+    kubeconfig_path,
+    new_config,
+    max_backups,
+    show_diff=False,
+    dry_run=False,
+    low_memory=False,
 ):
     from backup_manager import create_backup, manage_backups
     import shutil
@@ -68,101 +233,34 @@ def update_kubeconfig(
     logger.info(f"Running in {'dry run' if dry_run else 'normal'} mode")
 
     try:
-        # Validate the existing kubeconfig
-        is_valid, error = validate_kubeconfig(kubeconfig_path)
+        if low_memory:
+            with open(kubeconfig_path, "r") as f:
+                existing_config = yaml.safe_load(f)
+            is_valid, error = validate_kubeconfig(kubeconfig_path, existing_config)
+        else:
+            # Validate the existing kubeconfig
+            is_valid, error = validate_kubeconfig(kubeconfig_path)
         if not is_valid:
             raise ValueError(f"Invalid existing kubeconfig: {error}")
 
-        with open(kubeconfig_path, "r") as f:
-            existing_config = yaml.safe_load(f)
+        if not low_memory:
+            with open(kubeconfig_path, "r") as f:
+                existing_config = yaml.safe_load(f)
 
-        logger.debug(f"Existing config: {existing_config}")
+        logger.debug("Existing config: %s", existing_config)
 
-        # Get the cluster name from the new config
-        new_cluster_name = new_config.get("clusters", [{}])[0].get(
-            "name", "Unknown Cluster"
+        changes, diff_output, updated_config = compute_update(
+            existing_config, new_config, show_diff, low_memory
         )
 
-        # Check if the cluster already exists in the kubeconfig
-        existing_cluster = next(
-            (
-                c
-                for c in existing_config.get("clusters", [])
-                if c["name"] == new_cluster_name
-            ),
-            None,
-        )
-
-        updated_config = merge_configs(existing_config.copy(), new_config)
-
-        if existing_cluster:
-            if updated_config != existing_config:
-                changes.append(f"Updated cluster {new_cluster_name}")
-        else:
-            changes.append(f"Added new cluster {new_cluster_name}")
-
-        logger.debug(f"Updated config after merge: {updated_config}")
-
         if changes:
-            new_clusters = [
-                c
-                for c in updated_config.get("clusters", [])
-                if c["name"] == new_cluster_name
-            ]
-            new_contexts = [
-                c
-                for c in updated_config.get("contexts", [])
-                if new_cluster_name in c.get("context", {}).values()
-            ]
-            new_users = [
-                u
-                for u in updated_config.get("users", [])
-                if u["name"]
-                in [ctx.get("context", {}).get("user") for ctx in new_contexts]
-            ]
-
-            for cluster in new_clusters:
-                changes.append(f"  Updated cluster: {cluster['name']}")
-                # Print detailed cluster changes
-                old_cluster = next(
-                    (
-                        c
-                        for c in existing_config.get("clusters", [])
-                        if c["name"] == cluster["name"]
-                    ),
-                    {},
-                )
-                for key, value in cluster.get("cluster", {}).items():
-                    if (
-                        key not in old_cluster.get("cluster", {})
-                        or old_cluster["cluster"][key] != value
-                    ):
-                        changes.append(f"    {key}: {value}")
-            for context in new_contexts:
-                changes.append(f"  Updated context: {context['name']}")
-            for user in new_users:
-                changes.append(f"  Updated user: {user['name']}")
-            if "current-context" in new_config and new_config[
-                "current-context"
-            ] != existing_config.get("current-context"):
-                changes.append(
-                    f"  Updated current-context: {new_config['current-context']}"
-                )
-
-            if show_diff:
-                diff = difflib.unified_diff(
-                    yaml.dump(existing_config, default_flow_style=False).splitlines(),
-                    yaml.dump(updated_config, default_flow_style=False).splitlines(),
-                    fromfile="Original",
-                    tofile="Updated",
-                    lineterm="",
-                )
-                diff_output.extend(list(diff))
-
             if not dry_run:
                 backup_path = create_backup(kubeconfig_path)
                 with open(kubeconfig_path, "w") as f:
-                    yaml.dump(updated_config, f, default_flow_style=False)
+                    if low_memory:
+                        f.writelines(iter_yaml_dump(updated_config))
+                    else:
+                        yaml.dump(updated_config, f, default_flow_style=False)
                 manage_backups(kubeconfig_path, max_backups)
                 logger.info(
                     f"Kubeconfig updated successfully. Backup created at {backup_path}"
@@ -176,12 +274,11 @@ def update_kubeconfig(
         else:
             logger.info("No changes would be made to the kubeconfig.")
 
-    except Exception as e:
-        logger.error(f"Error updating kubeconfig: {e}")
+    except Exception:
         if not dry_run and backup_path:
             logger.info("Rolling back to the previous version...")
             shutil.copy2(backup_path, kubeconfig_path)
-        return [], []
+        raise
 
     return changes, diff_output, updated_config  # Return the updated_config as well
 
@@ -212,7 +309,9 @@ def merge_configs(existing_config, new_config):
                     existing_user.update(new_user)
                     existing_item["user"] = existing_user
             else:
-                existing_items[new_item["name"]] = new_item
+                # new_config may be shared between several targets, so never
+                # alias its items into the merged result.
+                existing_items[new_item["name"]] = copy.deepcopy(new_item)
         existing_config[key] = list(existing_items.values())
 
     # Update current-context
@@ -226,6 +325,6 @@ def merge_configs(existing_config, new_config):
             item for item in existing_config[key] if item["name"] in new_items
         ]
 
-    logger.debug(f"Merged config: {existing_config}")
+    logger.debug("Merged config: %s", existing_config)
     return existing_config
 
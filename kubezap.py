@@ -1,9 +1,27 @@
 import logging
 import yaml
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from cli import parse_args
 from config_manager import update_kubeconfig
-from utils import get_kubeconfig_path, get_download_location, get_config_files
+from plan_manager import (
+    apply_target,
+    create_plan,
+    load_plan,
+    plan_target,
+    save_plan,
+    verify_plan_inputs,
+)
+from remote_source import get_remote_config_files
+from utils import (
+    get_kubeconfig_paths,
+    get_download_location,
+    get_config_files,
+    get_peak_rss,
+    kubeconfig_lock,
+)
 from tqdm import tqdm
 from colorama import init, Fore, Style
 
@@ -11,6 +29,8 @@ init(autoreset=True)
 
 logger = logging.getLogger(__name__)
 
+_output_lock = threading.Lock()
+
 
 def setup_logging(verbose):
     level = logging.DEBUG if verbose else logging.INFO
@@ -32,28 +52,185 @@ def list_contexts(kubeconfig_path):
             logger.info(Fore.CYAN + f"  {name}")
 
 
-def main():
-    args = parse_args()
-    setup_logging(args.verbose)
+def load_config_files(config_files, config_names):
+    # Parse every incoming config exactly once; the parsed documents are
+    # shared read-only between all kubeconfig targets.
+    new_configs = []
+    for new_config_file, new_config_name in zip(config_files, config_names):
+        with open(new_config_file, "r") as f:
+            new_configs.append((new_config_name, yaml.safe_load(f)))
+    return new_configs
+
+
+def process_target(kubeconfig_path, new_configs, args, pbar):
+    result = {
+        "kubeconfig": kubeconfig_path,
+        "changes": [],
+        "diff_output": [],
+        "files_processed": 0,
+        "files_changed": 0,
+        "error": None,
+    }
 
     try:
-        kubeconfig_path = get_kubeconfig_path(args)
         if not kubeconfig_path.exists():
             raise FileNotFoundError(
                 f"Kubeconfig file not found at {kubeconfig_path}. Please provide a valid kubeconfig file."
             )
 
-        download_location = get_download_location(args)
+        lock = nullcontext() if args.dry_run else kubeconfig_lock(kubeconfig_path)
+        with lock:
+            for new_config_name, new_config in new_configs:
+                cluster_name = new_config.get("clusters", [{}])[0].get(
+                    "name", "Unknown Cluster"
+                )
+                pbar.set_description(f"Processing {cluster_name}")
+
+                file_changes, file_diff_output, _ = update_kubeconfig(
+                    kubeconfig_path,
+                    new_config,
+                    args.backup,
+                    args.diff,
+                    args.dry_run,
+                    args.low_memory,
+                )
+                if file_changes:
+                    result["changes"].append(
+                        f"Updated {cluster_name} from {new_config_name}"
+                    )
+                    if args.low_memory:
+                        # Stream the diff instead of holding it until the end
+                        stream_diff(kubeconfig_path, cluster_name, file_diff_output)
+                    else:
+                        result["diff_output"].extend(file_diff_output)
+                    result["files_changed"] += 1
+                result["files_processed"] += 1
+                pbar.update(1)
+    except Exception as e:
+        result["error"] = str(e)
+        logger.debug("Error details:", exc_info=True)
+
+    return result
+
 
-        new_config_files = get_config_files(
-            download_location, args.conf_name, args.number_of_configs
+def stream_diff(kubeconfig_path, cluster_name, diff_lines):
+    # Targets are processed in parallel; keep each diff in one piece
+    with _output_lock:
+        header_logged = False
+        for line in diff_lines:
+            if not header_logged:
+                logger.info(Fore.CYAN + f"Diff for {cluster_name} in {kubeconfig_path}:")
+                header_logged = True
+            logger.info(Fore.CYAN + line)
+
+
+def plan_process_target(kubeconfig_path, new_configs, args, pbar):
+    try:
+        result = plan_target(kubeconfig_path, new_configs, args.low_memory)
+        result["error"] = None
+    except Exception as e:
+        result = {"kubeconfig": str(kubeconfig_path), "error": str(e)}
+        logger.debug("Error details:", exc_info=True)
+    pbar.update(len(new_configs))
+    return result
+
+
+def apply_process_target(target, args, pbar):
+    result = dict(target, error=None)
+    try:
+        apply_target(target, args.backup)
+    except Exception as e:
+        result["error"] = str(e)
+        logger.debug("Error details:", exc_info=True)
+    pbar.update(1)
+    return result
+
+
+def apply_plan_file(args):
+    plan = load_plan(args.plan_file)
+    verify_plan_inputs(plan)
+    targets = plan["targets"]
+
+    with tqdm(total=len(targets), desc="Applying plan", unit="target") as pbar:
+        results = run_targets(
+            lambda target: apply_process_target(target, args, pbar),
+            targets,
+            args.jobs,
         )
+
+    for result in results:
+        report_target(result, args, show_target=len(targets) > 1)
+
+
+def run_targets(func, targets, jobs):
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(targets)))) as executor:
+        return list(executor.map(func, targets))
+
+
+def report_target(result, args, show_target):
+    if show_target:
+        logger.info(Fore.CYAN + f"Kubeconfig {result['kubeconfig']}:")
+
+    if result["error"]:
+        logger.error(Fore.RED + f"An error occurred: {result['error']}")
+        return
+
+    logger.info(
+        f"Processed {result['files_processed']} file(s), {result['files_changed']} file(s) resulted in changes."
+    )
+
+    if result["changes"]:
+        logger.info(Fore.GREEN + "Changes made:")
+        for change in result["changes"]:
+            logger.info(Fore.GREEN + f"- {change}")
+
+        if args.diff and result["diff_output"]:
+            logger.info(Fore.CYAN + "Diff:")
+            for line in result["diff_output"]:
+                logger.info(Fore.CYAN + line)
+
+        if not args.dry_run:
+            logger.info(
+                f"Backup created in: {os.path.dirname(result['kubeconfig'])}/kubezap_backups"
+            )
+
+
+def main():
+    args = parse_args()
+    setup_logging(args.verbose)
+
+    try:
+        if args.command == "apply":
+            apply_plan_file(args)
+            return
+
+        kubeconfig_paths = get_kubeconfig_paths(args)
+        if len(kubeconfig_paths) == 1 and not kubeconfig_paths[0].exists():
+            raise FileNotFoundError(
+                f"Kubeconfig file not found at {kubeconfig_paths[0]}. Please provide a valid kubeconfig file."
+            )
+
+        if args.source:
+            download_location = args.source
+            remote_configs = get_remote_config_files(
+                args.source, args.conf_name, args.number_of_configs, args.jobs
+            )
+            new_config_names = [name for name, _ in remote_configs]
+            new_config_files = [path for _, path in remote_configs]
+        else:
+            download_location = get_download_location(args)
+            new_config_files = get_config_files(
+                download_location, args.conf_name, args.number_of_configs
+            )
+            new_config_names = [os.path.basename(f) for f in new_config_files]
         logger.debug(f"Found config files: {new_config_files}")
 
         if not new_config_files:
             logger.warning(
                 Fore.YELLOW + f"No matching config files found in {download_location}"
             )
+            if args.source:
+                return
             logger.info(
                 Fore.CYAN
                 + f"To add config files, place them in {download_location} with names matching the pattern(s): {', '.join(args.conf_name) if args.conf_name else 'config*.yaml'}"
@@ -64,52 +241,28 @@ def main():
             )
             return
 
-        changes = []
-        diff_output = []
-        files_processed = 0
-        files_changed = 0
+        new_configs = load_config_files(new_config_files, new_config_names)
+        worker = plan_process_target if args.command == "plan" else process_target
+
         with tqdm(
-            total=len(new_config_files), desc="Processing config files", unit="file"
+            total=len(new_configs) * len(kubeconfig_paths),
+            desc="Processing config files",
+            unit="file",
         ) as pbar:
-            for new_config_file in new_config_files:
-                with open(new_config_file, "r") as f:
-                    new_config = yaml.safe_load(f)
-                cluster_name = new_config.get("clusters", [{}])[0].get(
-                    "name", "Unknown Cluster"
-                )
-                pbar.set_description(f"Processing {cluster_name}")
-
-                file_changes, file_diff_output = update_kubeconfig(
-                    kubeconfig_path, new_config, args.backup, args.diff, args.dry_run
-                )
-                if file_changes:
-                    changes.append(
-                        f"Updated {cluster_name} from {os.path.basename(new_config_file)}"
-                    )
-                    diff_output.extend(file_diff_output)
-                    files_changed += 1
-                files_processed += 1
-                pbar.update(1)
-
-        logger.info(
-            f"Processed {files_processed} file(s), {files_changed} file(s) resulted in changes."
-        )
-
-        if changes:
-            logger.info(Fore.GREEN + "Changes made:")
-            for change in changes:
-                logger.info(Fore.GREEN + f"- {change}")
+            results = run_targets(
+                lambda path: worker(path, new_configs, args, pbar),
+                kubeconfig_paths,
+                args.jobs,
+            )
 
-            if args.diff:
-                logger.info(Fore.CYAN + "Diff:")
-                for line in diff_output:
-                    logger.info(Fore.CYAN + line)
+        for result in results:
+            report_target(result, args, show_target=len(kubeconfig_paths) > 1)
 
-            # Removed listing of contexts
-            if not args.dry_run:
-                logger.info(
-                    f"Backup created in: {os.path.dirname(kubeconfig_path)}/kubezap_backups"
-                )
+        if args.command == "plan":
+            if any(result["error"] for result in results):
+                raise ValueError("Plan not written because some targets failed.")
+            save_plan(create_plan(new_config_files, results), args.output)
+            logger.info(Fore.GREEN + f"Plan written to {args.output}")
 
     except ValueError as e:
         logger.error(Fore.RED + f"An error occurred: {str(e)}")
@@ -118,6 +271,11 @@ def main():
     except Exception as e:
         logger.error(Fore.RED + f"An unexpected error occurred: {str(e)}")
         logger.debug("Error details:", exc_info=True)
+    finally:
+        if args.low_memory:
+            peak_rss = get_peak_rss()
+            if peak_rss is not None:
+                logger.info(f"Peak memory usage: {peak_rss / (1024 * 1024):.1f} MB")
 
 
 if __name__ == "__main__":
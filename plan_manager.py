@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import yaml
+
+from backup_manager import create_backup, manage_backups
+from config_manager import compute_update, iter_yaml_dump, validate_kubeconfig
+from utils import kubeconfig_lock
+
+logger = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def plan_target(kubeconfig_path, new_configs, low_memory=False):
+    kubeconfig_sha256 = file_sha256(kubeconfig_path)
+    with open(kubeconfig_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    is_valid, error = validate_kubeconfig(
+        kubeconfig_path, config if low_memory else None
+    )
+    if not is_valid:
+        raise ValueError(f"Invalid existing kubeconfig: {error}")
+
+    target = {
+        "kubeconfig": os.path.abspath(kubeconfig_path),
+        "sha256": kubeconfig_sha256,
+        "changes": [],
+        "diff_output": [],
+        "files_processed": 0,
+        "files_changed": 0,
+        "result": None,
+    }
+
+    for new_config_name, new_config in new_configs:
+        file_changes, file_diff_output, updated_config = compute_update(
+            config, new_config, show_diff=True, low_memory=low_memory
+        )
+        if file_changes:
+            cluster_name = new_config.get("clusters", [{}])[0].get(
+                "name", "Unknown Cluster"
+            )
+            target["changes"].append(
+                f"Updated {cluster_name} from {new_config_name}"
+            )
+            target["changes"].extend(f"  {change}" for change in file_changes)
+            target["diff_output"].extend(file_diff_output)
+            target["files_changed"] += 1
+            config = updated_config
+        target["files_processed"] += 1
+
+    if target["files_changed"]:
+        if low_memory:
+            target["result"] = "".join(iter_yaml_dump(config))
+        else:
+            target["result"] = yaml.dump(config, default_flow_style=False)
+
+    return target
+
+
+def create_plan(config_files, targets):
+    return {
+        "version": PLAN_VERSION,
+        "inputs": {os.path.abspath(path): file_sha256(path) for path in config_files},
+        "targets": targets,
+    }
+
+
+def save_plan(plan, plan_path):
+    # The plan holds the merged kubeconfig, credentials included
+    fd = os.open(plan_path, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0o600)
+    os.chmod(plan_path, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(plan, f, indent=2)
+
+
+def load_plan(plan_path):
+    with open(plan_path, "r") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(
+            f"Unsupported plan version {plan.get('version')} in {plan_path}"
+        )
+    return plan
+
+
+def verify_plan_inputs(plan):
+    stale = []
+    for path, sha256 in plan["inputs"].items():
+        if not os.path.exists(path) or file_sha256(path) != sha256:
+            stale.append(path)
+    if stale:
+        raise ValueError(
+            f"Config files changed since the plan was created: {', '.join(stale)}"
+        )
+
+
+def apply_target(target, max_backups):
+    kubeconfig_path = target["kubeconfig"]
+    if target["result"] is None:
+        return
+
+    backup_path = None
+    with kubeconfig_lock(kubeconfig_path):
+        if file_sha256(kubeconfig_path) != target["sha256"]:
+            raise ValueError(
+                f"Kubeconfig {kubeconfig_path} changed since the plan was created"
+            )
+        try:
+            backup_path = create_backup(kubeconfig_path)
+            with open(kubeconfig_path, "w") as f:
+                f.write(target["result"])
+            manage_backups(kubeconfig_path, max_backups)
+            logger.info(
+                f"Kubeconfig updated successfully. Backup created at {backup_path}"
+            )
+        except Exception:
+            if backup_path:
+                logger.info("Rolling back to the previous version...")
+                shutil.copy2(backup_path, kubeconfig_path)
+            raise
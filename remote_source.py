@@ -0,0 +1,234 @@
+import fnmatch
+import hashlib
+import http.client
+import json
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from cache_manager import get_cache_path
+
+logger = logging.getLogger(__name__)
+
+
+def _write_private(path, data):
+    os.makedirs(path.parent, mode=0o700, exist_ok=True)
+    os.chmod(path.parent, 0o700)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to a single host, reused across threads."""
+
+    def __init__(self, scheme, netloc, maxsize=4, timeout=30):
+        if scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {scheme}")
+        self.scheme = scheme
+        self.netloc = netloc
+        self.timeout = timeout
+        self._connections = queue.LifoQueue(maxsize)
+
+    def _new_connection(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+
+    def request(self, method, path, headers=None):
+        try:
+            conn, reused = self._connections.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._new_connection(), False
+
+        try:
+            try:
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+            except (
+                http.client.RemoteDisconnected,
+                ConnectionResetError,
+                BrokenPipeError,
+            ):
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection; retry once
+                conn.close()
+                conn = self._new_connection()
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+            body = response.read()
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            try:
+                self._connections.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        return response.status, response.headers, body
+
+    def close(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RemoteSource:
+    def __init__(self, index_url, jobs=4, cache_dir=None, timeout=30):
+        self.index_url = index_url
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+        if cache_dir is None:
+            source_key = hashlib.sha256(index_url.encode()).hexdigest()[:16]
+            cache_dir = get_cache_path().parent / "remote" / source_key
+        self.cache_dir = Path(cache_dir)
+        self._pools = {}
+        self.stats = {"fetched": 0, "not_modified": 0}
+        self._lock = threading.Lock()
+
+    def _pool(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = ConnectionPool(
+                    parts.scheme, parts.netloc, self.jobs, self.timeout
+                )
+            return self._pools[key]
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def fetch(self, url, cache_file):
+        meta_file = cache_file.with_name(cache_file.name + ".meta.json")
+
+        headers = {}
+        if cache_file.exists() and meta_file.exists():
+            with open(meta_file, "r") as f:
+                meta = json.load(f)
+            if meta.get("url") == url:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        status, response_headers, body = self._pool(url).request("GET", path, headers)
+
+        if status == 304 and headers:
+            logger.debug(f"{url} not modified, using cached copy")
+            self._count("not_modified")
+            return cache_file
+        if status != 200:
+            raise ValueError(f"Failed to fetch {url}: HTTP {status}")
+
+        # Cached configs hold credentials, so keep them private to the user
+        _write_private(cache_file, body)
+        _write_private(
+            meta_file,
+            json.dumps(
+                {
+                    "url": url,
+                    "etag": response_headers.get("ETag"),
+                    "last_modified": response_headers.get("Last-Modified"),
+                }
+            ).encode(),
+        )
+        self._count("fetched")
+        return cache_file
+
+    def _config_cache_file(self, url):
+        # Distinct URLs never share a cache file; the remote file name is only
+        # kept as a readable suffix and can't escape the cache directory.
+        url_key = hashlib.sha256(url.encode()).hexdigest()[:16]
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(urlsplit(url).path))
+        return self.cache_dir / "configs" / f"{url_key}-{safe_name}"
+
+    def get_index(self):
+        index_file = self.fetch(self.index_url, self.cache_dir / "index.json")
+        with open(index_file, "r") as f:
+            index = json.load(f)
+        if not isinstance(index, list):
+            raise ValueError(
+                f"Invalid index at {self.index_url}: expected a list of configs"
+            )
+        for entry in index:
+            if (
+                not isinstance(entry, dict)
+                or not isinstance(entry.get("name"), str)
+                or not isinstance(entry.get("url", ""), str)
+                or not isinstance(entry.get("modified", 0), (int, float))
+            ):
+                raise ValueError(
+                    f"Invalid index at {self.index_url}: expected entries with a string "
+                    f"name, an optional string url and an optional numeric modified, "
+                    f"got {entry!r}"
+                )
+
+        duplicates = sorted(
+            name
+            for name, count in Counter(entry["name"] for entry in index).items()
+            if count > 1
+        )
+        if duplicates:
+            raise ValueError(
+                f"Invalid index at {self.index_url}: duplicate names {', '.join(duplicates)}"
+            )
+        return index
+
+    def get_config_files(self, conf_names, num_configs):
+        entries = [
+            entry
+            for entry in self.get_index()
+            if not conf_names
+            or any(fnmatch.fnmatch(entry["name"], pattern) for pattern in conf_names)
+        ]
+        entries = sorted(entries, key=lambda e: e.get("modified", 0), reverse=True)
+        entries = entries[:num_configs]
+
+        urls = [urljoin(self.index_url, entry.get("url", entry["name"])) for entry in entries]
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            files = executor.map(
+                lambda url: self.fetch(url, self._config_cache_file(url)), urls
+            )
+            # Callers report configs by their index name, not the cache file name
+            return [(entry["name"], path) for entry, path in zip(entries, files)]
+
+
+def get_remote_config_files(source, conf_names, num_configs, jobs=4, cache_dir=None):
+    remote = RemoteSource(source, jobs, cache_dir)
+    try:
+        files = remote.get_config_files(conf_names, num_configs)
+    finally:
+        remote.close()
+    logger.debug(
+        f"Fetched {remote.stats['fetched']} file(s) from {source}, "
+        f"{remote.stats['not_modified']} not modified"
+    )
+    return files
@@ -3,12 +3,38 @@ import tempfile
 from pathlib import Path
 import yaml
 import argparse
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-from utils import get_kubeconfig_path, get_download_location, get_config_files
-from config_manager import merge_configs, update_kubeconfig
+from utils import (
+    get_kubeconfig_path,
+    get_kubeconfig_paths,
+    get_download_location,
+    get_config_files,
+    kubeconfig_lock,
+)
+from config_manager import (
+    compute_update,
+    iter_yaml_dump,
+    merge_configs,
+    update_kubeconfig,
+)
 from backup_manager import create_backup, manage_backups
-from cli import CustomFormatter, VersionAction
+from plan_manager import (
+    apply_target,
+    create_plan,
+    load_plan,
+    plan_target,
+    save_plan,
+    verify_plan_inputs,
+)
+from cache_manager import RACY_WINDOW_NS, list_directory_files
+from cli import CustomFormatter, VersionAction, parse_args
+from kubezap import process_target
+from remote_source import get_remote_config_files
 
 
 @pytest.fixture
@@ -47,6 +73,60 @@ def test_get_kubeconfig_path_error(mock_args):
         get_kubeconfig_path(mock_args)
 
 
+def test_get_kubeconfig_paths_glob(mock_args, temp_dir):
+    (temp_dir / "team-a").touch()
+    (temp_dir / "team-b").touch()
+    mock_args.kubeconfig = [str(temp_dir / "team-*"), str(temp_dir / "team-a")]
+    paths = get_kubeconfig_paths(mock_args)
+    assert paths == [temp_dir / "team-a", temp_dir / "team-b"]
+
+
+def test_get_kubeconfig_paths_glob_skips_kubezap_files(mock_args, temp_dir):
+    kubeconfig = temp_dir / "team-a"
+    kubeconfig.write_text("team-a")
+    mock_args.kubeconfig = [str(temp_dir / "*")]
+    assert get_kubeconfig_paths(mock_args) == [kubeconfig]
+
+    # A second run sees the backups directory and possibly a held lock
+    create_backup(kubeconfig)
+    (temp_dir / "team-a.lock").touch()
+    assert get_kubeconfig_paths(mock_args) == [kubeconfig]
+
+
+def test_get_kubeconfig_paths_no_match(mock_args, temp_dir):
+    mock_args.kubeconfig = [str(temp_dir / "missing-*")]
+    with pytest.raises(ValueError):
+        get_kubeconfig_paths(mock_args)
+
+
+def test_kubeconfig_lock(temp_dir):
+    kubeconfig = temp_dir / "config"
+    with kubeconfig_lock(kubeconfig) as lock_path:
+        assert os.path.exists(lock_path)
+        with pytest.raises(TimeoutError):
+            with kubeconfig_lock(kubeconfig, timeout=0):
+                pass
+    assert not os.path.exists(lock_path)
+
+
+def test_parse_args_options_before_command():
+    args = parse_args(["-d", "-k", "k1", "k2", "plan", "-l", "dl", "-o", "plan.bin"])
+    assert args.command == "plan"
+    assert args.kubeconfig == ["k1", "k2"]
+    assert args.diff is True
+    assert args.download_location == "dl"
+    assert args.backup == 5
+
+
+def test_parse_args_command_name_as_option_value():
+    args = parse_args(["-l", "plan", "-k", "x"])
+    assert args.command is None
+    assert args.download_location == "plan"
+    args = parse_args(["-c", "apply", "-k", "x"])
+    assert args.command is None
+    assert args.conf_name == ["apply"]
+
+
 def test_get_download_location_custom(mock_args):
     mock_args.download_location = "/custom/download"
     path = get_download_location(mock_args)
@@ -99,6 +179,130 @@ def test_merge_configs():
     assert len(merged["users"]) == 2
 
 
+def test_merge_configs_does_not_alias_new_config():
+    new_config = {
+        "clusters": [{"name": "cluster1", "cluster": {"server": "https://1.1.1.1"}}],
+    }
+    merged = merge_configs({"clusters": []}, new_config)
+    merged["clusters"][0]["cluster"]["server"] = "https://2.2.2.2"
+    assert new_config["clusters"][0]["cluster"]["server"] == "https://1.1.1.1"
+
+
+def test_compute_update_low_memory_matches_default():
+    def existing():
+        return {
+            "clusters": [{"name": "cluster1", "cluster": {"server": "https://1.1.1.1"}}],
+            "current-context": "context1",
+        }
+
+    new_config = {
+        "clusters": [{"name": "cluster1", "cluster": {"server": "https://2.2.2.2"}}],
+        "current-context": "context2",
+    }
+    changes, diff_output, updated = compute_update(existing(), new_config, True)
+    low_changes, low_diff_output, low_updated = compute_update(
+        existing(), new_config, True, low_memory=True
+    )
+    assert low_changes == changes
+    assert list(low_diff_output) == diff_output
+    assert low_updated == updated
+
+    unchanged_changes, _, _ = compute_update(updated, new_config, low_memory=True)
+    assert unchanged_changes == []
+
+
+def test_iter_yaml_dump_matches_yaml_dump():
+    config = {
+        "apiVersion": "v1",
+        "kind": "Config",
+        "clusters": [
+            {"name": "cluster1", "cluster": {"server": "https://1.1.1.1"}},
+            {"name": "cluster2", "cluster": {"server": "https://2.2.2.2"}},
+        ],
+        "contexts": [],
+        "users": [{"name": "user1", "user": {"exec": {"args": ["a", "b"]}}}],
+        "preferences": {},
+    }
+    assert "".join(iter_yaml_dump(config)) == yaml.dump(config, default_flow_style=False)
+
+
+class _NullProgress:
+    def set_description(self, desc):
+        pass
+
+    def update(self, n=1):
+        pass
+
+
+def test_process_target_reports_failed_target(temp_dir):
+    good = temp_dir / "good"
+    good.write_text(
+        yaml.dump(
+            {
+                "apiVersion": "v1",
+                "kind": "Config",
+                "clusters": [{"name": "old", "cluster": {"server": "https://9.9.9.9"}}],
+            }
+        )
+    )
+    bad = temp_dir / "bad"
+    bad.write_text("kind: Config\nclusters: []\n")
+    new_config = {
+        "clusters": [{"name": "cluster1", "cluster": {"server": "https://1.1.1.1"}}],
+    }
+    args = argparse.Namespace(backup=5, diff=False, dry_run=False, low_memory=False)
+
+    results = [
+        process_target(path, [("config1.yaml", new_config)], args, _NullProgress())
+        for path in [good, bad]
+    ]
+    assert results[0]["error"] is None
+    assert results[0]["files_changed"] == 1
+    assert "Invalid existing kubeconfig" in results[1]["error"]
+    assert results[1]["files_changed"] == 0
+
+
+def test_low_memory_diffs_are_not_interleaved(temp_dir, caplog):
+    def kubeconfig(prefix):
+        return {
+            "apiVersion": "v1",
+            "kind": "Config",
+            "clusters": [
+                {"name": f"{prefix}-{i}", "cluster": {"server": f"https://{prefix}-{i}"}}
+                for i in range(300)
+            ],
+        }
+
+    targets = []
+    for prefix in ["t1", "t2"]:
+        path = temp_dir / prefix
+        path.write_text(yaml.dump(kubeconfig(prefix)))
+        targets.append(path)
+    new_config = {
+        "clusters": [{"name": "cluster1", "cluster": {"server": "https://1.1.1.1"}}],
+    }
+    args = argparse.Namespace(backup=5, diff=True, dry_run=True, low_memory=True)
+
+    with caplog.at_level("INFO"):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(
+                executor.map(
+                    lambda path: process_target(
+                        path, [("config1.yaml", new_config)], args, _NullProgress()
+                    ),
+                    targets,
+                )
+            )
+
+    current_target = None
+    for record in caplog.records:
+        message = record.getMessage()
+        if "Diff for cluster1 in" in message:
+            current_target = Path(message.rstrip(":").split(" in ")[-1]).name
+        elif "server: https://t" in message:
+            assert f"https://{current_target}-" in message
+
+
 def test_create_backup(temp_dir):
     kubeconfig = temp_dir / "config"
     kubeconfig.write_text("test config")
@@ -106,3 +310,215 @@ def test_create_backup(temp_dir):
     assert backup.exists()
     assert backup.parent.name == "kubezap_backups"
 
+
+def test_manage_backups_per_target(temp_dir):
+    for name in ["config", "team-a"]:
+        kubeconfig = temp_dir / name
+        kubeconfig.write_text(name)
+        for _ in range(3):
+            create_backup(kubeconfig)
+    manage_backups(temp_dir / "team-a", 1)
+    backups = os.listdir(temp_dir / "kubezap_backups")
+    assert len([b for b in backups if b.endswith(".team-a.yaml")]) == 1
+    assert len([b for b in backups if not b.endswith(".team-a.yaml")]) == 3
+
+
+def test_manage_backups_legacy_names(temp_dir):
+    backup_dir = temp_dir / "kubezap_backups"
+    backup_dir.mkdir()
+    legacy = ["kubeconfig_backup_20200101_000000.yaml", "kubeconfig_backup_20200102_000000.yaml"]
+    for name in legacy:
+        (backup_dir / name).touch()
+    config = temp_dir / "config"
+    config.write_text("config")
+    create_backup(config)
+
+    # Only one target: old unsuffixed backups count as its own
+    manage_backups(config, 2)
+    assert sorted(os.listdir(backup_dir))[0] == legacy[1]
+    assert len(os.listdir(backup_dir)) == 2
+
+    # Several targets: old backups can't be attributed, so they are kept
+    dev = temp_dir / "dev.yaml"
+    dev.write_text("dev")
+    create_backup(dev)
+    manage_backups(config, 1)
+    manage_backups(dev, 1)
+    assert legacy[1] in os.listdir(backup_dir)
+    assert len(os.listdir(backup_dir)) == 3
+
+
+@pytest.fixture
+def plan_setup(temp_dir):
+    kubeconfig = temp_dir / "config"
+    kubeconfig.write_text(
+        yaml.dump(
+            {
+                "apiVersion": "v1",
+                "kind": "Config",
+                "clusters": [{"name": "old", "cluster": {"server": "https://9.9.9.9"}}],
+            }
+        )
+    )
+    new_config_file = temp_dir / "config1.yaml"
+    new_config = {
+        "apiVersion": "v1",
+        "kind": "Config",
+        "clusters": [{"name": "cluster1", "cluster": {"server": "https://1.1.1.1"}}],
+    }
+    new_config_file.write_text(yaml.dump(new_config))
+    target = plan_target(kubeconfig, [("config1.yaml", new_config)])
+    plan_path = temp_dir / "plan.bin"
+    save_plan(create_plan([new_config_file], [target]), plan_path)
+    return kubeconfig, new_config_file, plan_path
+
+
+def test_plan_and_apply(plan_setup):
+    kubeconfig, _, plan_path = plan_setup
+    plan = load_plan(plan_path)
+    verify_plan_inputs(plan)
+    apply_target(plan["targets"][0], 5)
+    applied = yaml.safe_load(kubeconfig.read_text())
+    assert [c["name"] for c in applied["clusters"]] == ["cluster1"]
+    assert len(os.listdir(kubeconfig.parent / "kubezap_backups")) == 1
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+def test_save_plan_is_private(plan_setup):
+    _, _, plan_path = plan_setup
+    assert plan_path.stat().st_mode & 0o777 == 0o600
+
+
+def test_apply_rejects_stale_plan(plan_setup):
+    kubeconfig, new_config_file, plan_path = plan_setup
+    plan = load_plan(plan_path)
+    kubeconfig.write_text(kubeconfig.read_text() + "preferences: {}\n")
+    with pytest.raises(ValueError):
+        apply_target(plan["targets"][0], 5)
+    new_config_file.write_text("changed")
+    with pytest.raises(ValueError):
+        verify_plan_inputs(plan)
+
+
+def test_list_directory_files_cache(temp_dir):
+    download_dir = temp_dir / "downloads"
+    download_dir.mkdir()
+    (download_dir / "config1.yaml").touch()
+    (download_dir / "subdir").mkdir()
+    old_mtime_ns = download_dir.stat().st_mtime_ns - 2 * RACY_WINDOW_NS
+    os.utime(download_dir, ns=(old_mtime_ns, old_mtime_ns))
+    cache_path = temp_dir / "cache" / "completion.json"
+
+    assert list_directory_files(download_dir, cache_path) == ["config1.yaml"]
+    assert cache_path.exists()
+
+    # An unchanged directory mtime is served from the cache.
+    (download_dir / "config2.yaml").touch()
+    os.utime(download_dir, ns=(old_mtime_ns, old_mtime_ns))
+    assert list_directory_files(download_dir, cache_path) == ["config1.yaml"]
+
+    os.utime(download_dir, ns=(old_mtime_ns + 1, old_mtime_ns + 1))
+    assert list_directory_files(download_dir, cache_path) == [
+        "config1.yaml",
+        "config2.yaml",
+    ]
+
+
+@pytest.fixture
+def config_server():
+    documents = {
+        "/index.json": json.dumps(
+            [
+                {"name": "config-a.yaml", "url": "configs/a"},
+                {"name": "config-b.yaml", "url": "configs/b"},
+                {"name": "other.yaml", "url": "configs/other"},
+            ]
+        ),
+        "/configs/a": yaml.dump({"clusters": [{"name": "a", "cluster": {}}]}),
+        "/configs/b": yaml.dump({"clusters": [{"name": "b", "cluster": {}}]}),
+        "/configs/other": yaml.dump({"clusters": []}),
+    }
+    requests = []
+    connections = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            connections.add(self.client_address)
+            etag = f'"{len(documents[self.path])}"'
+            if self.headers.get("If-None-Match") == etag:
+                requests.append((self.path, 304))
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            requests.append((self.path, 200))
+            body = documents[self.path].encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/index.json", requests, connections, documents
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_remote_config_files(config_server, temp_dir):
+    index_url, requests, connections, _ = config_server
+    remote_configs = get_remote_config_files(index_url, ["config-*.yaml"], 5, 1, temp_dir)
+    assert [name for name, _ in remote_configs] == ["config-a.yaml", "config-b.yaml"]
+    files = [path for _, path in remote_configs]
+    assert yaml.safe_load(files[0].read_text())["clusters"][0]["name"] == "a"
+    assert ("/configs/other", 200) not in requests
+    assert len(connections) == 1
+
+    requests.clear()
+    remote_configs = get_remote_config_files(index_url, ["config-*.yaml"], 5, 1, temp_dir)
+    assert [name for name, _ in remote_configs] == ["config-a.yaml", "config-b.yaml"]
+    assert all(status == 304 for _, status in requests)
+
+
+def test_get_remote_config_files_same_basename(config_server, temp_dir):
+    index_url, _, _, documents = config_server
+    documents["/index.json"] = json.dumps(
+        [{"name": "team-a/config.yaml"}, {"name": "team-b/config.yaml"}]
+    )
+    documents["/team-a/config.yaml"] = documents["/configs/a"]
+    documents["/team-b/config.yaml"] = documents["/configs/b"]
+    remote_configs = get_remote_config_files(index_url, ["*config.yaml"], 5, 2, temp_dir)
+    files = [path for _, path in remote_configs]
+    assert len(set(files)) == 2
+    names = [yaml.safe_load(f.read_text())["clusters"][0]["name"] for f in files]
+    assert names == ["a", "b"]
+    if os.name != "nt":
+        assert all(f.stat().st_mode & 0o777 == 0o600 for f in files)
+        assert files[0].parent.stat().st_mode & 0o777 == 0o700
+
+
+def test_get_remote_config_files_duplicate_names(config_server, temp_dir):
+    index_url, _, _, documents = config_server
+    documents["/index.json"] = json.dumps(
+        [
+            {"name": "config.yaml", "url": "configs/a"},
+            {"name": "config.yaml", "url": "configs/b"},
+        ]
+    )
+    with pytest.raises(ValueError):
+        get_remote_config_files(index_url, ["*.yaml"], 5, 2, temp_dir)
+
+
+def test_get_remote_config_files_malformed_index(config_server, temp_dir):
+    index_url, _, _, documents = config_server
+    for index in [["config-a.yaml"], [{"url": "configs/a"}], [{"name": 1}]]:
+        documents["/index.json"] = json.dumps(index)
+        with pytest.raises(ValueError, match="Invalid index"):
+            get_remote_config_files(index_url, ["*"], 5, 1, temp_dir)
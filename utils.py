@@ -1,17 +1,81 @@
+import glob
 import os
+import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 
 def get_kubeconfig_path(args):
+    return get_kubeconfig_paths(args)[0]
+
+
+def get_kubeconfig_paths(args):
     if args.kubeconfig:
-        return Path(args.kubeconfig).expanduser()
+        patterns = args.kubeconfig
+        if isinstance(patterns, (str, os.PathLike)):
+            patterns = [patterns]
     elif "KUBECONFIG" in os.environ:
-        return Path(os.environ["KUBECONFIG"]).expanduser()
+        patterns = [os.environ["KUBECONFIG"]]
     else:
         raise ValueError(
             "Kubeconfig file location not provided. Please specify using --kubeconfig or set KUBECONFIG environment variable."
         )
 
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        pattern = os.path.expanduser(str(pattern))
+        if glob.has_magic(pattern):
+            # Skip what kubezap itself creates next to a kubeconfig
+            matches = sorted(
+                match
+                for match in glob.glob(pattern)
+                if os.path.isfile(match)
+                and not match.endswith(".lock")
+                and "kubezap_backups" not in Path(match).parts
+            )
+            if not matches:
+                raise ValueError(f"No kubeconfig files match the pattern {pattern}")
+        else:
+            matches = [pattern]
+        for match in matches:
+            path = Path(match)
+            key = os.path.normcase(os.path.abspath(path))
+            if key not in seen:
+                seen.add(key)
+                paths.append(path)
+    return paths
+
+
+@contextmanager
+def kubeconfig_lock(kubeconfig_path, timeout=30, poll_interval=0.1):
+    lock_path = f"{kubeconfig_path}.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Timed out waiting for lock on {kubeconfig_path}. "
+                    f"Remove {lock_path} if no other kubezap run is active."
+                )
+            time.sleep(poll_interval)
+
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        yield lock_path
+    finally:
+        os.close(fd)
+        os.unlink(lock_path)
+
 
 def get_download_location(args):
     if args.download_location:
@@ -40,3 +104,10 @@ def get_config_files(download_location, conf_names, num_configs):
     files = sorted(files, key=os.path.getmtime, reverse=True)
     return files[:num_configs]
 
+
+def get_peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024